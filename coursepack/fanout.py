@@ -0,0 +1,358 @@
+import errno
+import gzip
+import hashlib
+import os
+import shutil
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import click
+
+try:
+    import fcntl
+except ImportError:  # Windows: no reflinks, fall back to copies
+    fcntl = None
+
+from coursepack.planner import _ensure_directory
+
+# Linux FICLONE ioctl: share extents copy-on-write (btrfs, XFS, overlay).
+FICLONE = 0x40049409
+
+LINK_MODES = ["auto", "reflink", "hardlink", "copy"]
+
+
+# --- Helper Functions ---
+
+
+def student_seed(student: str) -> int:
+    """Stable per-student seed for problem variants."""
+    return int.from_bytes(hashlib.sha256(student.encode()).digest()[:4], "big")
+
+
+def check_student_id(student: str) -> None:
+    """Raises ValueError unless `student` is a single plain path component.
+
+    Ids name directories that get deleted and rebuilt, so "", ".", "..",
+    separators and absolute paths are rejected.
+    """
+    if (
+        not student
+        or student in (".", "..")
+        or "/" in student
+        or "\\" in student
+        or os.path.isabs(student)
+        or Path(student).name != student
+    ):
+        raise ValueError(f"Invalid student id {student!r}.")
+
+
+def _reflink(src: Path, dest: Path) -> None:
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflink not supported")
+    with open(src, "rb") as s, open(dest, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            dest.unlink()
+            raise
+    shutil.copystat(src, dest)
+
+
+def _place(src: Path, dest: Path, mode: str) -> str:
+    """Materializes `src` at `dest` as cheaply as `mode` allows.
+
+    Returns the method actually used. In "auto" mode reflinks are preferred,
+    then a plain copy. Hardlinks are only used when asked for: they share one
+    inode, so a student editing a file in place (or a rerun rewriting
+    course_repo) would change every student's copy and the canonical tree.
+    """
+    if mode in ("auto", "reflink"):
+        try:
+            _reflink(src, dest)
+            return "reflink"
+        except OSError:
+            if mode == "reflink":
+                raise
+    if mode == "hardlink":
+        os.link(src, dest)
+        return "hardlink"
+    shutil.copy2(src, dest)
+    return "copy"
+
+
+def _canonical_files(course_dir: Path) -> List[Path]:
+    return sorted(
+        p.relative_to(course_dir) for p in course_dir.rglob("*") if p.is_file()
+    )
+
+
+def student_overrides(
+    student: str,
+    course_dir: Path,
+    overrides_dir: Optional[Path] = None,
+    readme_block: Optional[str] = None,
+) -> Dict[Path, bytes]:
+    """Files that differ for `student`, keyed by repo-relative path.
+
+    Files under `overrides_dir/<student>/` replace (or add to) the canonical
+    tree. `readme_block` has `{student}` and `{seed}` substituted (any other
+    braces, e.g. in code or LaTeX, are left alone) and is appended to the
+    canonical README.md.
+    """
+    overrides: Dict[Path, bytes] = {}
+
+    if overrides_dir is not None:
+        student_dir = overrides_dir / student
+        if student_dir.is_dir():
+            for rel in _canonical_files(student_dir):
+                overrides[rel] = (student_dir / rel).read_bytes()
+
+    if readme_block is not None:
+        readme = Path("README.md")
+        base = overrides.get(readme)
+        if base is None:
+            base = (course_dir / readme).read_bytes()
+        block = readme_block.replace("{student}", student).replace(
+            "{seed}", str(student_seed(student))
+        )
+        overrides[readme] = base + b"\n" + block.encode()
+
+    return overrides
+
+
+# --- Core Logic ---
+
+
+def build_student_repo(
+    course_dir: Path,
+    dest: Path,
+    overrides: Dict[Path, bytes],
+    link_mode: str = "auto",
+) -> Dict[str, int]:
+    """Builds one student tree. Returns how many files used each method."""
+    stats: Dict[str, int] = {}
+    for rel in _canonical_files(course_dir):
+        if rel in overrides:
+            continue
+        target = dest / rel
+        _ensure_directory(target.parent)
+        method = _place(course_dir / rel, target, link_mode)
+        stats[method] = stats.get(method, 0) + 1
+
+    for rel, data in overrides.items():
+        target = dest / rel
+        _ensure_directory(target.parent)
+        with open(target, "wb") as f:
+            f.write(data)
+    stats["override"] = len(overrides)
+    return stats
+
+
+def _tar_member(rel: Path, data: bytes, mode: int = 0o644, mtime: float = 0) -> bytes:
+    """One uncompressed tar member (header plus padded data)."""
+    info = tarfile.TarInfo(str(rel))
+    info.size = len(data)
+    info.mode = mode
+    info.mtime = int(mtime)
+    padding = -len(data) % tarfile.BLOCKSIZE
+    return info.tobuf(tarfile.PAX_FORMAT) + data + tarfile.NUL * padding
+
+
+def _clone(src: Path, dest: Path) -> None:
+    """Copies `src` to `dest`, sharing extents when the filesystem can."""
+    try:
+        _reflink(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+def write_base_archive(
+    course_dir: Path, files: List[Path], base_path: Path, fmt: str
+) -> None:
+    """Compresses the files every student shares, once.
+
+    The tar base is a gzip member holding tar members without the
+    end-of-archive marker, so per-student members can follow it.
+    """
+    if fmt == "tar":
+        with gzip.open(base_path, "wb") as gz:
+            for rel in files:
+                src = course_dir / rel
+                st = src.stat()
+                gz.write(
+                    _tar_member(rel, src.read_bytes(), st.st_mode & 0o777, st.st_mtime)
+                )
+    else:
+        with zipfile.ZipFile(base_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            for rel in files:
+                zf.write(course_dir / rel, arcname=str(rel))
+
+
+def write_student_archive(
+    course_dir: Path,
+    base_path: Path,
+    archive_path: Path,
+    extra_files: List[Path],
+    overrides: Dict[Path, bytes],
+    fmt: str,
+) -> None:
+    """Writes one student archive as the shared base plus a small tail.
+
+    `extra_files` are canonical files left out of the base because some
+    student overrides them, and this student does not. Only they and the
+    student's overrides are compressed here. The base is cloned (reflinked
+    where possible), so time and disk use follow the per-student differences.
+    """
+    _clone(base_path, archive_path)
+
+    if fmt == "tar":
+        now = time.time()
+        # Concatenated gzip members form one valid .tar.gz stream.
+        with open(archive_path, "ab") as f, gzip.GzipFile(fileobj=f, mode="wb") as gz:
+            for rel in extra_files:
+                src = course_dir / rel
+                st = src.stat()
+                gz.write(
+                    _tar_member(rel, src.read_bytes(), st.st_mode & 0o777, st.st_mtime)
+                )
+            for rel, data in sorted(overrides.items()):
+                gz.write(_tar_member(rel, data, mtime=now))
+            gz.write(tarfile.NUL * (2 * tarfile.BLOCKSIZE))
+    else:
+        with zipfile.ZipFile(archive_path, "a", zipfile.ZIP_DEFLATED) as zf:
+            for rel in extra_files:
+                zf.write(course_dir / rel, arcname=str(rel))
+            for rel, data in sorted(overrides.items()):
+                zf.writestr(str(rel), data)
+
+
+def fan_out(
+    course_dir: str,
+    students: List[str],
+    output_dir: str = "student_repos",
+    overrides_dir: Optional[str] = None,
+    readme_block: Optional[str] = None,
+    link_mode: str = "auto",
+    archive: Optional[str] = None,
+) -> None:
+    """Builds one repo (or archive) per student from a canonical course repo."""
+    for student in students:
+        check_student_id(student)
+
+    course = Path(course_dir)
+    out = Path(output_dir)
+    _ensure_directory(out)
+    out_root = out.resolve()
+    overrides_path = Path(overrides_dir) if overrides_dir else None
+
+    if archive:
+        suffix = ".tar.gz" if archive == "tar" else ".zip"
+        # Files any student overrides stay out of the shared base archive.
+        overridden = set()
+        for student in students:
+            overridden |= student_overrides(
+                student, course, overrides_path, readme_block
+            ).keys()
+        files = _canonical_files(course)
+        base_path = out / f".base{suffix}"
+        write_base_archive(
+            course, [rel for rel in files if rel not in overridden], base_path, archive
+        )
+
+    totals: Dict[str, int] = {}
+    for student in students:
+        overrides = student_overrides(student, course, overrides_path, readme_block)
+        if archive:
+            extra = [rel for rel in files if rel in overridden and rel not in overrides]
+            write_student_archive(
+                course,
+                base_path,
+                out / f"{student}{suffix}",
+                extra,
+                overrides,
+                archive,
+            )
+        else:
+            dest = out / student
+            if dest.resolve().parent != out_root:
+                raise ValueError(f"{dest} resolves outside {out}.")
+            if dest.exists():
+                shutil.rmtree(dest)
+            stats = build_student_repo(course, dest, overrides, link_mode)
+            for method, n in stats.items():
+                totals[method] = totals.get(method, 0) + n
+        print(f"✓ Built repo for {student}")
+
+    if archive:
+        base_path.unlink()
+
+    if totals:
+        summary = ", ".join(f"{n} {method}" for method, n in sorted(totals.items()))
+        print(f"Files: {summary}")
+
+
+@click.command()
+@click.argument("course_dir", default="course_repo")
+@click.option(
+    "--students",
+    "roster",
+    type=click.Path(exists=True),
+    help="File with one student id per line.",
+)
+@click.option("--count", default=0, help="Generate ids student_001..N instead.")
+@click.option("--output-dir", default="student_repos")
+@click.option(
+    "--overrides",
+    "overrides_dir",
+    type=click.Path(exists=True, file_okay=False),
+    help="Directory of per-student files: <dir>/<student>/<path>.",
+)
+@click.option(
+    "--readme-block",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Template appended to each README; may use {student} and {seed}.",
+)
+@click.option("--link", "link_mode", type=click.Choice(LINK_MODES), default="auto")
+@click.option(
+    "--archive",
+    type=click.Choice(["tar", "zip"]),
+    default=None,
+    help="Write one archive per student instead of a directory.",
+)
+def main(
+    course_dir: str,
+    roster: Optional[str],
+    count: int,
+    output_dir: str,
+    overrides_dir: Optional[str],
+    readme_block: Optional[str],
+    link_mode: str,
+    archive: Optional[str],
+) -> None:
+    if roster:
+        with open(roster) as f:
+            students = [line.strip() for line in f if line.strip()]
+    else:
+        students = [f"student_{i:03d}" for i in range(1, count + 1)]
+    if not students:
+        raise click.UsageError("Provide --students or --count.")
+    for student in students:
+        try:
+            check_student_id(student)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+
+    block = None
+    if readme_block:
+        with open(readme_block) as f:
+            block = f.read()
+
+    fan_out(course_dir, students, output_dir, overrides_dir, block, link_mode, archive)
+
+
+if __name__ == "__main__":
+    main()
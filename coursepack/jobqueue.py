@@ -0,0 +1,627 @@
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import click
+import typing_extensions as typing
+from google import genai
+
+from coursepack.planner import (
+    ARTIFACT_MODEL,
+    _create_client,
+    _ensure_directory,
+    _exam_configs,
+    _generate_exam,
+    _generate_week_artifacts,
+    _plan_sections,
+    _request_week_plan,
+    _week_start,
+    _write_repo_scaffold,
+    export_calendar,
+)
+from coursepack.tracing import per_process_path, profile, span, traced
+
+# --- Schema Definitions ---
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, kind);
+"""
+
+
+class Job(typing.TypedDict):
+    """A claimed unit of work."""
+
+    id: int
+    kind: str
+    key: str
+    payload: Dict[str, Any]
+    attempts: int
+
+
+class JobSpec(typing.TypedDict):
+    """A job to enqueue."""
+
+    kind: str
+    key: str
+    payload: Dict[str, Any]
+
+
+# --- Queue ---
+
+
+class JobQueue:
+    """Durable SQLite job queue with leases, shared through a directory.
+
+    Workers on any host that can see `queue_dir` claim jobs under a lease and
+    extend it with heartbeats. A job whose lease expires (worker died or lost
+    the filesystem) is handed to the next claimant until `max_attempts` is
+    reached. Lease expiry uses wall-clock time, so hosts need synced clocks.
+
+    Claims are only exclusive if the shared filesystem implements POSIX
+    byte-range locks correctly, since SQLite relies on them. Local disks do.
+    NFS and SMB mounts often do not (or only with specific lock daemons and
+    mount options), and two workers may then claim the same job or corrupt
+    the database. Check the mount before running workers on several hosts.
+    """
+
+    def __init__(
+        self, queue_dir: str, lease_seconds: float = 300.0, max_attempts: int = 3
+    ) -> None:
+        self.queue_dir = Path(queue_dir)
+        _ensure_directory(self.queue_dir)
+        self.db_path = self.queue_dir / "jobs.sqlite3"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        conn = sqlite3.connect(self.db_path, timeout=60)
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # One connection per call keeps the queue safe to share across threads.
+        # BEGIN IMMEDIATE takes the write lock up front, so claims cannot race
+        # as long as the filesystem honours SQLite's locks (see class docs).
+        conn = sqlite3.connect(self.db_path, timeout=60, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def enqueue(self, jobs: List[JobSpec]) -> None:
+        """Adds jobs. Keys that already exist are left untouched."""
+        with self._transaction() as conn:
+            self._insert(conn, jobs)
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, jobs: List[JobSpec]) -> None:
+        conn.executemany(
+            "INSERT OR IGNORE INTO jobs (kind, key, payload) VALUES (?, ?, ?)",
+            [(j["kind"], j["key"], json.dumps(j["payload"])) for j in jobs],
+        )
+
+    def claim(self, owner: str) -> Optional[Job]:
+        """Leases the oldest runnable job to `owner`, or returns None."""
+        now = time.time()
+        with self._transaction() as conn:
+            # Expired leases that have used up their attempts are abandoned.
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = 'lease expired' "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, RUNNING, now, self.max_attempts),
+            )
+            row = conn.execute(
+                "SELECT id, kind, key, payload, attempts FROM jobs "
+                "WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                "ORDER BY id LIMIT 1",
+                (PENDING, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (RUNNING, owner, now + self.lease_seconds, row[0]),
+            )
+        return Job(
+            id=row[0],
+            kind=row[1],
+            key=row[2],
+            payload=json.loads(row[3]),
+            attempts=row[4] + 1,
+        )
+
+    def heartbeat(self, job_id: int, owner: str) -> bool:
+        """Extends the lease. Returns False if `owner` no longer holds it."""
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET lease_expires = ? "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (time.time() + self.lease_seconds, job_id, RUNNING, owner),
+            )
+            return cur.rowcount == 1
+
+    def complete(
+        self,
+        job_id: int,
+        owner: str,
+        result: Any = None,
+        follow_ups: Optional[List[JobSpec]] = None,
+    ) -> bool:
+        """Marks a job done and atomically enqueues its follow-up jobs.
+
+        Returns False (and changes nothing) if the lease was lost.
+        """
+        with self._transaction() as conn:
+            cur = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (DONE, json.dumps(result), job_id, RUNNING, owner),
+            )
+            if cur.rowcount != 1:
+                return False
+            self._insert(conn, follow_ups or [])
+        return True
+
+    def fail(self, job_id: int, owner: str, error: str) -> None:
+        """Releases a job for retry, or marks it failed after max attempts."""
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                "error = ?, lease_owner = NULL, lease_expires = NULL "
+                "WHERE id = ? AND status = ? AND lease_owner = ?",
+                (self.max_attempts, FAILED, PENDING, error, job_id, RUNNING, owner),
+            )
+
+    def counts(self, kind: Optional[str] = None) -> Dict[str, int]:
+        """Number of jobs per status, optionally for one kind."""
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) FROM jobs "
+                "WHERE ? IS NULL OR kind = ? GROUP BY status",
+                (kind, kind),
+            ).fetchall()
+        return {status: n for status, n in rows}
+
+    def results(self, kind: str) -> List[Any]:
+        """Results of all finished jobs of `kind`, in enqueue order."""
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT result FROM jobs WHERE kind = ? AND status = ? ORDER BY id",
+                (kind, DONE),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def failures(self) -> List[Dict[str, str]]:
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT key, error FROM jobs WHERE status = ? ORDER BY id", (FAILED,)
+            ).fetchall()
+        return [{"key": key, "error": error} for key, error in rows]
+
+    def is_empty(self) -> bool:
+        return not self.counts()
+
+    def reset(self) -> None:
+        """Drops every job and reopens the run, e.g. to enqueue a new config."""
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM jobs")
+        (self.queue_dir / "closed").unlink(missing_ok=True)
+
+    def close(self) -> None:
+        """Signals that no further jobs will be enqueued for this run."""
+        (self.queue_dir / "closed").touch()
+
+    def is_closed(self) -> bool:
+        return (self.queue_dir / "closed").exists()
+
+    def is_settled(self, kind: Optional[str] = None) -> bool:
+        """True once no job (of `kind`) is pending or running."""
+        counts = self.counts(kind)
+        return counts.get(PENDING, 0) == 0 and counts.get(RUNNING, 0) == 0
+
+
+# --- Job Handlers ---
+
+
+def _publish(staging: Path, output_dir: Path) -> None:
+    """Moves every file under `staging` into `output_dir`.
+
+    Each file lands with an atomic rename, so a retried job simply replaces
+    the previous attempt's output and readers never see a partial file.
+    """
+    for src in sorted(p for p in staging.rglob("*") if p.is_file()):
+        dest = output_dir / src.relative_to(staging)
+        _ensure_directory(dest.parent)
+        os.replace(src, dest)
+    shutil.rmtree(staging, ignore_errors=True)
+
+
+def _handle_plan_week(
+    client: genai.Client, payload: Dict[str, Any], staging: Path
+) -> Dict[str, Any]:
+    # Let the real error propagate so the queue records it in `failures()`.
+    return _request_week_plan(
+        client,
+        payload["section"],
+        payload["subsections"],
+        payload["week"],
+        datetime.fromisoformat(payload["week_start"]),
+        payload.get("pages"),
+    )
+
+
+def _handle_week_artifacts(
+    client: genai.Client, payload: Dict[str, Any], staging: Path
+) -> None:
+    # strict: API errors must fail the job (and retry) rather than land in files.
+    _generate_week_artifacts(
+        client, ARTIFACT_MODEL, payload["week"], staging, strict=True
+    )
+
+
+def _handle_exam(client: genai.Client, payload: Dict[str, Any], staging: Path) -> None:
+    exams_dir = staging / "exams"
+    _ensure_directory(exams_dir)
+    _generate_exam(
+        client,
+        ARTIFACT_MODEL,
+        payload["title"],
+        payload["topics"],
+        exams_dir,
+        strict=True,
+    )
+
+
+HANDLERS: Dict[str, Callable[[genai.Client, Dict[str, Any], Path], Any]] = {
+    "plan_week": _handle_plan_week,
+    "week_artifacts": _handle_week_artifacts,
+    "exam": _handle_exam,
+}
+
+
+def _follow_ups(job: Job, result: Any) -> List[JobSpec]:
+    # A planned week immediately unlocks its homework artifacts.
+    if job["kind"] == "plan_week":
+        return [
+            JobSpec(
+                kind="week_artifacts",
+                key=f"week_artifacts:{result['week']:02d}",
+                payload={"week": result},
+            )
+        ]
+    return []
+
+
+# --- Worker / Coordinator ---
+
+
+def _load_run(queue_dir: str) -> Dict[str, Any]:
+    with open(Path(queue_dir) / "run.json") as f:
+        return json.load(f)
+
+
+def run_worker(
+    queue: JobQueue,
+    owner: Optional[str] = None,
+    poll_interval: float = 2.0,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """Claims and runs jobs until the run is closed and drained.
+
+    When `stop` is given the worker instead runs until it is set.
+    """
+    owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    run = _load_run(str(queue.queue_dir))
+    output_dir = Path(run["output_dir"])
+    client = _create_client(run["config"])
+
+    while not (stop and stop.is_set()):
+        job = queue.claim(owner)
+        if job is None:
+            if stop is None and queue.is_closed() and queue.is_settled():
+                return
+            time.sleep(poll_interval)
+            continue
+
+        # Keep the lease alive while the (slow) API calls run.
+        done = threading.Event()
+
+        def beat(job_id: int = job["id"]) -> None:
+            while not done.wait(queue.lease_seconds / 3):
+                if not queue.heartbeat(job_id, owner):
+                    return
+
+        heart = threading.Thread(target=beat, daemon=True)
+        heart.start()
+
+        staging = output_dir / ".staging" / f"{job['id']}-{uuid.uuid4().hex[:8]}"
+        try:
+            with span(job["kind"], cat="job", key=job["key"], attempt=job["attempts"]):
+                result = HANDLERS[job["kind"]](client, job["payload"], staging)
+            done.set()
+            # A re-claimed job's newer attempt owns the output now; don't
+            # mix this attempt's files into it.
+            if queue.heartbeat(job["id"], owner):
+                if staging.exists():
+                    _publish(staging, output_dir)
+                completed = queue.complete(
+                    job["id"], owner, result, _follow_ups(job, result)
+                )
+            else:
+                shutil.rmtree(staging, ignore_errors=True)
+                completed = False
+            if completed:
+                print(f"✓ [{owner}] {job['key']}")
+            else:
+                print(f"⚠ [{owner}] Lost lease on {job['key']}; result discarded.")
+        except Exception as e:
+            done.set()
+            shutil.rmtree(staging, ignore_errors=True)
+            queue.fail(job["id"], owner, str(e))
+            print(f"✗ [{owner}] {job['key']}: {e}")
+        heart.join()
+
+
+def enqueue_course(
+    queue: JobQueue, config: Dict[str, Any], output_dir: str, reset: bool = False
+) -> None:
+    """Records the run settings and enqueues one planning job per section.
+
+    Job keys only identify a week or exam, so a queue holds a single run.
+    Enqueueing into a queue that already has jobs raises unless `reset`
+    drops them first.
+    """
+    if reset:
+        queue.reset()
+    elif not queue.is_empty():
+        raise ValueError(
+            f"{queue.queue_dir} already holds a run; use a new queue directory "
+            "or reset it first."
+        )
+
+    with open(queue.queue_dir / "run.json", "w") as f:
+        json.dump({"config": config, "output_dir": output_dir}, f, indent=2)
+
+    jobs: List[JobSpec] = []
+    for i, (section_key, section_subs, pages) in enumerate(_plan_sections(config)):
+        jobs.append(
+            JobSpec(
+                kind="plan_week",
+                key=f"plan_week:{i + 1:02d}",
+                payload={
+                    "section": section_key,
+                    "subsections": section_subs,
+                    "pages": pages,
+                    "week": i + 1,
+                    "week_start": _week_start(config, i + 1).isoformat(),
+                },
+            )
+        )
+    queue.enqueue(jobs)
+    print(f"Enqueued {len(jobs)} planning jobs in {queue.queue_dir}")
+
+
+def _local_worker(
+    queue: JobQueue, stop: threading.Event, profile_path: Optional[str]
+) -> None:
+    # cProfile only sees the thread that enabled it, so each worker gets one.
+    with profile(profile_path):
+        run_worker(queue, stop=stop)
+
+
+def _wait_until_settled(
+    queue: JobQueue,
+    kind: Optional[str],
+    workers: List[threading.Thread],
+    poll_interval: float,
+) -> None:
+    while not queue.is_settled(kind):
+        if workers and not any(w.is_alive() for w in workers):
+            raise RuntimeError("All local workers died; see the errors above.")
+        time.sleep(poll_interval)
+
+
+def coordinate(
+    queue: JobQueue,
+    local_workers: int = 0,
+    poll_interval: float = 2.0,
+    profile_path: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Drives a queued run to completion and builds the final course repo.
+
+    Waits for all planning jobs, writes `plan.json` and `plan.ics`, enqueues
+    the exams (which need every week's topics), then waits for the remaining
+    artifact jobs and writes the repo scaffold. With `profile_path` each
+    local worker thread writes its own profile ("run.prof" ->
+    "run.worker1.prof").
+    """
+    run = _load_run(str(queue.queue_dir))
+    config, output_dir = run["config"], Path(run["output_dir"])
+
+    stop = threading.Event()
+    workers = []
+    for i in range(local_workers):
+        worker_profile = None
+        if profile_path:
+            path = Path(profile_path)
+            worker_profile = str(
+                path.with_name(f"{path.stem}.worker{i + 1}{path.suffix}")
+            )
+        workers.append(
+            threading.Thread(
+                target=_local_worker,
+                args=(queue, stop, worker_profile),
+                daemon=True,
+            )
+        )
+    for w in workers:
+        w.start()
+
+    try:
+        with span("planning"):
+            # Planning jobs are enqueued up front; follow-ups never add more.
+            _wait_until_settled(queue, "plan_week", workers, poll_interval)
+
+        weeks = sorted(queue.results("plan_week"), key=lambda w: w["week"])
+        plan = {"weeks": weeks}
+
+        with span("write_plan_json"):
+            with open("plan.json", "w") as f:
+                json.dump(plan, f, indent=2)
+
+        with span("export_calendar"):
+            export_calendar(plan, config)
+
+        queue.enqueue(
+            [
+                JobSpec(
+                    kind="exam",
+                    key=f"exam:{title}",
+                    payload={"title": title, "topics": topics},
+                )
+                for title, topics in _exam_configs(weeks)
+            ]
+        )
+        queue.close()
+
+        with span("artifacts"):
+            _wait_until_settled(queue, None, workers, poll_interval)
+
+        _ensure_directory(output_dir / "exams")
+        _write_repo_scaffold(output_dir)
+        shutil.rmtree(output_dir / ".staging", ignore_errors=True)
+    finally:
+        stop.set()
+        for w in workers:
+            w.join()
+
+    for failure in queue.failures():
+        print(f"✗ Job {failure['key']} failed: {failure['error']}")
+    return plan
+
+
+# --- CLI ---
+
+
+@click.group()
+@click.option(
+    "--queue-dir",
+    default="coursepack_queue",
+    help="Shared directory holding the job database.",
+)
+@click.option(
+    "--lease-seconds", default=300.0, help="How long a claimed job stays leased."
+)
+@click.option("--max-attempts", default=3, help="Attempts before a job is failed.")
+@click.pass_context
+def main(
+    ctx: click.Context, queue_dir: str, lease_seconds: float, max_attempts: int
+) -> None:
+    ctx.obj = JobQueue(queue_dir, lease_seconds, max_attempts)
+
+
+@main.command()
+@click.argument("config_path", default="config.json")
+@click.option("--output-dir", default="course_repo")
+@click.option(
+    "--reset", is_flag=True, help="Drop any jobs left from a previous run first."
+)
+@click.pass_obj
+def enqueue(queue: JobQueue, config_path: str, output_dir: str, reset: bool) -> None:
+    """Enqueues planning jobs for CONFIG_PATH."""
+    with open(config_path) as f:
+        config = json.load(f)
+    try:
+        enqueue_course(queue, config, os.path.abspath(output_dir), reset)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+
+def _trace_options(f: Callable) -> Callable:
+    f = click.option(
+        "--profile",
+        "profile_path",
+        default=None,
+        help="Dump cProfile stats; host and pid are added to the file name.",
+    )(f)
+    return click.option(
+        "--trace",
+        "trace_path",
+        default=None,
+        help="Write Chrome trace-event JSON; host and pid are added to the file name.",
+    )(f)
+
+
+def _per_process(path: Optional[str]) -> Optional[str]:
+    return per_process_path(path) if path else None
+
+
+@main.command()
+@click.option("--poll-interval", default=2.0)
+@_trace_options
+@click.pass_obj
+def worker(
+    queue: JobQueue,
+    poll_interval: float,
+    trace_path: Optional[str],
+    profile_path: Optional[str],
+) -> None:
+    """Runs jobs until the queue is drained."""
+    with traced("worker", _per_process(trace_path), _per_process(profile_path)):
+        run_worker(queue, poll_interval=poll_interval)
+
+
+@main.command(name="coordinate")
+@click.option("--local-workers", default=0, help="Worker threads to run here too.")
+@click.option("--poll-interval", default=2.0)
+@_trace_options
+@click.pass_obj
+def coordinate_command(
+    queue: JobQueue,
+    local_workers: int,
+    poll_interval: float,
+    trace_path: Optional[str],
+    profile_path: Optional[str],
+) -> None:
+    """Waits for all jobs and builds the final course repository."""
+    profile_path = _per_process(profile_path)
+    with traced("coordinate", _per_process(trace_path), profile_path):
+        coordinate(queue, local_workers, poll_interval, profile_path)
+
+
+if __name__ == "__main__":
+    main()
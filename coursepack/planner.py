@@ -3,14 +3,23 @@ import os
 import subprocess
 from datetime import datetime, time, timedelta
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
+import click
 import typing_extensions as typing
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 from icalendar import Calendar, Event
 
+from coursepack.toc_index import TocEntry, TocIndex, split_code
+from coursepack.tracing import span, traced
+
+# Model used to plan each week (structured JSON output)
+PLAN_MODEL = "gemini-2.5-flash-lite"
+# Fast model used for bulk artifact generation
+ARTIFACT_MODEL = "gemini-2.5-flash-lite"
+
 # --- Templates ---
 
 # Common LaTeX Preamble for Scheme styling
@@ -323,28 +332,36 @@ def _ensure_directory(path: Path):
     path.mkdir(parents=True, exist_ok=True)
 
 
-def _generate_content_with_ai(
+def _request_content(
     client: genai.Client, model: str, prompt: str, mime_type: str = "text/plain"
 ) -> str:
-    """Helper to generate text content (LaTeX, Scheme, etc.) via AI."""
-    try:
+    """Generates text content (LaTeX, Scheme, etc.) via AI. Raises on failure."""
+    with span("generate_content", cat="api", model=model):
         response = client.models.generate_content(
             model=model,
             contents=prompt,
             config=types.GenerateContentConfig(response_mime_type=mime_type),
         )
-        text = response.text.strip()
-
-        # Clean up Markdown backticks if present
-        if text.startswith("```"):
-            lines = text.splitlines()
-            if lines:
-                lines = lines[1:]
-            if lines and lines[-1].strip() == "```":
-                lines = lines[:-1]
-            text = "\n".join(lines)
-
-        return text
+    text = response.text.strip()
+
+    # Clean up Markdown backticks if present
+    if text.startswith("```"):
+        lines = text.splitlines()
+        if lines:
+            lines = lines[1:]
+        if lines and lines[-1].strip() == "```":
+            lines = lines[:-1]
+        text = "\n".join(lines)
+
+    return text
+
+
+def _generate_content_with_ai(
+    client: genai.Client, model: str, prompt: str, mime_type: str = "text/plain"
+) -> str:
+    """Helper to generate text content (LaTeX, Scheme, etc.) via AI."""
+    try:
+        return _request_content(client, model, prompt, mime_type)
     except Exception as e:
         print(f"Error generating content: {e}")
         return f"; Error generating content: {e}"
@@ -357,17 +374,18 @@ def _compile_latex(file_path: Path) -> None:
         # Run pdflatex.
         # -interaction=nonstopmode prevents it from hanging on errors.
         # -output-directory ensures output stays with source.
-        subprocess.run(
-            [
-                "pdflatex",
-                "-interaction=nonstopmode",
-                f"-output-directory={file_path.parent}",
-                str(file_path),
-            ],
-            check=True,
-            stdout=subprocess.DEVNULL,  # Suppress noisy output
-            stderr=subprocess.PIPE,
-        )
+        with span("pdflatex", cat="subprocess", file=file_path.name):
+            subprocess.run(
+                [
+                    "pdflatex",
+                    "-interaction=nonstopmode",
+                    f"-output-directory={file_path.parent}",
+                    str(file_path),
+                ],
+                check=True,
+                stdout=subprocess.DEVNULL,  # Suppress noisy output
+                stderr=subprocess.PIPE,
+            )
         print(f"✓ PDF generated for {file_path.name}")
     except FileNotFoundError:
         print("⚠ pdflatex not found. Skipping PDF generation.")
@@ -377,151 +395,368 @@ def _compile_latex(file_path: Path) -> None:
         print(f"✗ Error compiling LaTeX: {e}")
 
 
-# --- Core Logic ---
+def _create_client(config: Dict[str, Any]) -> genai.Client:
+    """Builds a Gemini client from GEMINI_API_KEY or the config."""
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY") or config.get("gemini_api_key")
+    if not api_key:
+        raise ValueError(
+            "Missing GEMINI_API_KEY in .env or gemini_api_key in configuration."
+        )
+    return genai.Client(api_key=api_key)
+
+
+def _open_toc_index(config: Dict[str, Any]) -> Optional[TocIndex]:
+    """Opens the book's TOC index (book.toc_index, default toc.idx) if present."""
+    path = config.get("book", {}).get("toc_index", "toc.idx")
+    if not os.path.exists(path):
+        return None
+    return TocIndex(path)
+
+
+def _indexed_entry(
+    index: Optional[TocIndex], label: str, warn: bool = True
+) -> Optional[TocEntry]:
+    """The index entry numbered like `label`, if its title matches too.
+
+    Positional codes in the index can be off (e.g. front matter counted as a
+    chapter), so a hit whose title differs from the label is not trusted.
+    """
+    code, title = split_code(label)
+    entry = index.lookup(code) if index and code else None
+    if entry is None:
+        return None
+    if (
+        " ".join(entry["title"].split()).casefold()
+        != " ".join(title.split()).casefold()
+    ):
+        if warn:
+            print(
+                f"⚠ TOC index has '{entry['title']}' as {code}, not '{title}'; "
+                "ignoring the index for it."
+            )
+        return None
+    return entry
 
 
-def generate_course_artifacts(
-    client: genai.Client,
-    plan: Dict[str, Any],
+def _group_subsections(
+    subsections: List[str], index: Optional[TocIndex] = None
+) -> Dict[str, List[str]]:
+    """Groups subsection labels (e.g. "1.2.3 Title") by section ("1.2").
+
+    With a TOC index the section is the entry's section-level ancestor;
+    codes missing from the index, or indexed under another title, are
+    grouped by their first two parts.
+    """
+    sections_map: Dict[str, List[str]] = {}
+    for sub in subsections:
+        code, _ = split_code(sub)
+        entry = _indexed_entry(index, sub)
+        if index is not None and entry is not None:
+            section_key = index.ancestor(entry["code"], 1)["code"]
+        elif code is not None:
+            section_key = ".".join(code.split(".")[:2])
+        else:
+            print(f"⚠ No section number in '{sub}'; grouping under General.")
+            section_key = "General"
+        if section_key not in sections_map:
+            sections_map[section_key] = []
+        sections_map[section_key].append(sub)
+    return sections_map
+
+
+def _section_pages(
+    index: Optional[TocIndex], section_key: str, section_subs: List[str]
+) -> Optional[List[int]]:
+    """[first page, last page] of a section, via a subsection whose title matched."""
+    if index is None:
+        return None
+    for sub in section_subs:
+        entry = _indexed_entry(index, sub, warn=False)
+        if entry is None:
+            continue
+        section = index.ancestor(entry["code"], 1)
+        if section is not None and section["code"] == section_key:
+            return [section["page_start"], section["page_end"]]
+    return None
+
+
+def _plan_sections(
     config: Dict[str, Any],
-    output_dir: str = "course_repo",
-) -> None:
-    """Generates the physical files for the course (LaTeX, Tests, Workflows)."""
+) -> List[Tuple[str, List[str], Optional[List[int]]]]:
+    """(section, subsections, [first page, last page]) for each week to plan.
 
-    base_path = Path(output_dir)
-    _ensure_directory(base_path)
+    Page ranges come from the TOC index and are None without one, or when
+    none of the section's subsections match their indexed titles.
+    """
+    subsections = config.get("book", {}).get("subsections", [])
+    index = _open_toc_index(config)
+    try:
+        sections = []
+        for section_key, section_subs in _group_subsections(subsections, index).items():
+            pages = _section_pages(index, section_key, section_subs)
+            sections.append((section_key, section_subs, pages))
+        return sections
+    finally:
+        if index is not None:
+            index.close()
 
-    print(f"\n--- Generating Course Repository in '{output_dir}' ---")
 
-    # 1. GitHub Workflow
+def _week_start(config: Dict[str, Any], week_num: int) -> datetime:
+    """Monday of the given 1-based week of the term."""
+    start = datetime.fromisoformat(config["quarter"]["start"])
+    return start + timedelta(weeks=week_num - 1)
+
+
+def _write_repo_scaffold(base_path: Path) -> None:
+    """Writes the GitHub workflow and student README into the course repo."""
     workflow_path = base_path / ".github" / "workflows"
     _ensure_directory(workflow_path)
     with open(workflow_path / "verify.yml", "w") as f:
         f.write(GITHUB_WORKFLOW_TEMPLATE)
     print("✓ Created GitHub Workflow (Guile Scheme)")
 
-    # 2. Student README (Instructions)
     with open(base_path / "README.md", "w") as f:
         f.write(STUDENT_README_TEMPLATE)
     print("✓ Created Student README.md")
 
-    # 3. Iterate Weeks for Homework
-    weeks = plan.get("weeks", [])
-    model_name = "gemini-2.5-flash-lite"  # Use a fast model for bulk generation
 
-    all_topics = []  # Collect topics for exam generation
+def _exam_configs(weeks: List[Dict[str, Any]]) -> List[Tuple[str, List[str]]]:
+    """Returns (title, topics) for Midterm 1, Midterm 2 and the Final."""
+    total_weeks = len(weeks)
+    if total_weeks == 0:
+        return []
 
+    all_topics: List[str] = []  # Collect topics for exam generation
     for week in weeks:
-        week_num = week["week"]
-        topics = week.get("key_concepts", [])
-        all_topics.extend(topics)
+        all_topics.extend(week.get("key_concepts", []))
 
-        week_dir = base_path / "homework" / f"week_{week_num:02d}"
-        _ensure_directory(week_dir)
+    # Determine Checkpoints
+    m1_idx = total_weeks // 3
+    m2_idx = (total_weeks * 2) // 3
 
-        # A. Generate COMPLETE LaTeX Document (Scheme Context)
-        hw_prompt = f"""
-        Act as a Computer Science professor teaching SICP.
-        Generate a COMPLETE LaTeX document (including preamble, \\begin{{document}}, and \\end{{document}}) for a Scheme programming assignment.
+    return [
+        ("Midterm 1", all_topics[: m1_idx * 3]),  # Rough approximation of topics
+        ("Midterm 2", all_topics[m1_idx * 3 : m2_idx * 3]),
+        ("Final Exam", all_topics),
+    ]
 
-        Topics: {", ".join(topics)}
-        Textbook Exercises: {", ".join(week["homework"]["exercises"])}
-        Description: {week["homework"]["description"]}
 
-        Format requirements:
-        - Use clean LaTeX.
-        - Include 3-4 distinct problems that require writing Scheme code.
-        - **MIMIC THE FOLLOWING FORMATTING STYLE STRICTLY (Same packages, header style, colors, listings settings):**
-        - Do not include extraneous information such as name, date, or student ID.
-        - Do not include a due date.
-        - The title of the homework should be "Homework {week_num}"
+def _request_week_plan(
+    client: genai.Client,
+    section_key: str,
+    section_subs: List[str],
+    week_num: int,
+    week_start: datetime,
+    pages: Optional[List[int]] = None,
+) -> Dict[str, Any]:
+    """Asks the model for one week's lesson plan. Raises on failure."""
+    subs_list_str = "\n".join(f"- {s}" for s in section_subs)
+    pages_str = f"Textbook pages: {pages[0]}-{pages[1]}\n    " if pages else ""
+    prompt = f"""
+    Context: Generating a course plan for SICP. Section: "{section_key}"
+    Subsections: {subs_list_str}
+    {pages_str}Task: Create a 1-week lesson plan covering this section.
+    """
+
+    with span("generate_content", cat="api", model=PLAN_MODEL):
+        response = client.models.generate_content(
+            model=PLAN_MODEL,
+            contents=prompt,
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json", response_schema=WeekPlan
+            ),
+        )
+    week_data = json.loads(response.text)
+    week_data.update(
+        {
+            "section": section_key,
+            "pages": pages,
+            "week": week_num,
+            "dates": {
+                "monday": week_start.date().isoformat(),
+                "wednesday": (week_start + timedelta(days=2)).date().isoformat(),
+                "friday": (week_start + timedelta(days=4)).date().isoformat(),
+            },
+        }
+    )
+    return week_data
+
+
+def _plan_week(
+    client: genai.Client,
+    section_key: str,
+    section_subs: List[str],
+    week_num: int,
+    week_start: datetime,
+    pages: Optional[List[int]] = None,
+) -> Optional[Dict[str, Any]]:
+    """Like `_request_week_plan`, but logs failures and returns None."""
+    try:
+        week_data = _request_week_plan(
+            client, section_key, section_subs, week_num, week_start, pages
+        )
+        print(f"✓ Planned Week {week_num}")
+        return week_data
+    except Exception as e:
+        print(f"✗ Error Planning Week {week_num}: {e}")
+        return None
 
-        {HW_ONE_SHOT_EXAMPLE}
-        """
 
-        latex_code = _generate_content_with_ai(client, model_name, hw_prompt)
+def _generate_week_artifacts(
+    client: genai.Client,
+    model_name: str,
+    week: Dict[str, Any],
+    base_path: Path,
+    strict: bool = False,
+) -> None:
+    """Generates the homework LaTeX, Scheme test and solution stub for one week.
 
-        tex_file = week_dir / "assignment.tex"
-        with open(tex_file, "w") as f:
-            f.write(latex_code)
+    API errors are written into the files unless `strict`, which raises them.
+    """
+    generate = _request_content if strict else _generate_content_with_ai
+    week_num = week["week"]
+    topics = week.get("key_concepts", [])
 
-        # Compile PDF
-        # _compile_latex(tex_file)
+    week_dir = base_path / "homework" / f"week_{week_num:02d}"
+    _ensure_directory(week_dir)
 
-        # B. Generate Verification Code (Scheme Test)
-        test_prompt = f"""
-        Act as a QA Engineer for a Scheme course.
-        Create a Scheme test file to verify the homework concepts for this week.
+    # A. Generate COMPLETE LaTeX Document (Scheme Context)
+    hw_prompt = f"""
+    Act as a Computer Science professor teaching SICP.
+    Generate a COMPLETE LaTeX document (including preamble, \\begin{{document}}, and \\end{{document}}) for a Scheme programming assignment.
 
-        Topics: {", ".join(topics)}
+    Topics: {", ".join(topics)}
+    Textbook Exercises: {", ".join(week["homework"]["exercises"])}
+    Description: {week["homework"]["description"]}
 
-        Requirements:
-        1. The test file MUST load the student solution: `(load "solution_week_{week_num}.scm")`.
-        2. It MUST define simple test cases using standard Scheme comparisons.
-        3. It MUST print "PASS: <testname>" or "FAIL: <testname>".
-        4. CRITICAL: If any test fails, the script MUST exit with `(exit 1)`. If all pass, `(exit 0)`.
+    Format requirements:
+    - Use clean LaTeX.
+    - Include 3-4 distinct problems that require writing Scheme code.
+    - **MIMIC THE FOLLOWING FORMATTING STYLE STRICTLY (Same packages, header style, colors, listings settings):**
+    - Do not include extraneous information such as name, date, or student ID.
+    - Do not include a due date.
+    - The title of the homework should be "Homework {week_num}"
 
-        STRICT FORMATTING RULES:
-        - Return ONLY the Scheme code.
-        - Do NOT use markdown code blocks (no backticks).
-        - Do NOT include comments saying "Assume solution.py exists" or "Placeholder functions".
-        - Do NOT use Python comments (#) or file extensions (.py). Use Scheme comments (;).
-        - Assume `solution_week_{week_num}.scm` is the ONLY source of truth for the function implementations.
-        """
+    {HW_ONE_SHOT_EXAMPLE}
+    """
 
-        test_code = _generate_content_with_ai(client, model_name, test_prompt)
+    latex_code = generate(client, model_name, hw_prompt)
 
-        # Create a dummy solution file so tests pass (or fail gracefully)
-        with open(week_dir / f"solution_week_{week_num}.scm", "w") as f:
-            f.write(f"; Student solution for Week {week_num}\n\n(define (solve) #t)\n")
+    tex_file = week_dir / "assignment.tex"
+    with open(tex_file, "w") as f:
+        f.write(latex_code)
 
-        with open(week_dir / f"test_week_{week_num}.scm", "w") as f:
-            f.write(test_code)
+    # Compile PDF
+    # _compile_latex(tex_file)
 
-        print(f"✓ Generated Scheme Artifacts for Week {week_num}")
+    # B. Generate Verification Code (Scheme Test)
+    test_prompt = f"""
+    Act as a QA Engineer for a Scheme course.
+    Create a Scheme test file to verify the homework concepts for this week.
 
-    # 4. Generate Exams (2 Midterms, 1 Final)
-    exams_dir = base_path / "exams"
-    _ensure_directory(exams_dir)
+    Topics: {", ".join(topics)}
 
-    total_weeks = len(weeks)
-    if total_weeks > 0:
-        # Determine Checkpoints
-        m1_idx = total_weeks // 3
-        m2_idx = (total_weeks * 2) // 3
+    Requirements:
+    1. The test file MUST load the student solution: `(load "solution_week_{week_num}.scm")`.
+    2. It MUST define simple test cases using standard Scheme comparisons.
+    3. It MUST print "PASS: <testname>" or "FAIL: <testname>".
+    4. CRITICAL: If any test fails, the script MUST exit with `(exit 1)`. If all pass, `(exit 0)`.
 
-        exam_configs = [
-            ("Midterm 1", all_topics[: m1_idx * 3]),  # Rough approximation of topics
-            ("Midterm 2", all_topics[m1_idx * 3 : m2_idx * 3]),
-            ("Final Exam", all_topics),
-        ]
+    STRICT FORMATTING RULES:
+    - Return ONLY the Scheme code.
+    - Do NOT use markdown code blocks (no backticks).
+    - Do NOT include comments saying "Assume solution.py exists" or "Placeholder functions".
+    - Do NOT use Python comments (#) or file extensions (.py). Use Scheme comments (;).
+    - Assume `solution_week_{week_num}.scm` is the ONLY source of truth for the function implementations.
+    """
 
-        for title, topics_subset in exam_configs:
-            print(f"... Generating {title}")
-            exam_prompt = f"""
-            Act as a Computer Science professor teaching SICP.
-            Generate a COMPLETE LaTeX document for a {title}.
+    test_code = generate(client, model_name, test_prompt)
 
-            Topics Covered: {", ".join(topics_subset[:20])}... (list truncated)
+    # Create a dummy solution file so tests pass (or fail gracefully)
+    with open(week_dir / f"solution_week_{week_num}.scm", "w") as f:
+        f.write(f"; Student solution for Week {week_num}\n\n(define (solve) #t)\n")
 
-            Requirements:
-            - 5 conceptual questions about Scheme / Lisp.
-            - 2 coding questions (write Scheme code on paper).
-            - Formal academic tone.
-            - **MIMIC THE FOLLOWING FORMATTING STYLE STRICTLY (Same packages, colors, listings settings):**
+    with open(week_dir / f"test_week_{week_num}.scm", "w") as f:
+        f.write(test_code)
 
-            {EXAM_ONE_SHOT_EXAMPLE}
-            """
+    print(f"✓ Generated Scheme Artifacts for Week {week_num}")
 
-            exam_code = _generate_content_with_ai(client, model_name, exam_prompt)
 
-            filename = title.lower().replace(" ", "_") + ".tex"
-            tex_file = exams_dir / filename
-            with open(tex_file, "w") as f:
-                f.write(exam_code)
+def _generate_exam(
+    client: genai.Client,
+    model_name: str,
+    title: str,
+    topics_subset: List[str],
+    exams_dir: Path,
+    strict: bool = False,
+) -> None:
+    """Generates the LaTeX source for a single exam.
+
+    API errors are written into the file unless `strict`, which raises them.
+    """
+    generate = _request_content if strict else _generate_content_with_ai
+    print(f"... Generating {title}")
+    exam_prompt = f"""
+    Act as a Computer Science professor teaching SICP.
+    Generate a COMPLETE LaTeX document for a {title}.
+
+    Topics Covered: {", ".join(topics_subset[:20])}... (list truncated)
+
+    Requirements:
+    - 5 conceptual questions about Scheme / Lisp.
+    - 2 coding questions (write Scheme code on paper).
+    - Formal academic tone.
+    - **MIMIC THE FOLLOWING FORMATTING STYLE STRICTLY (Same packages, colors, listings settings):**
+
+    {EXAM_ONE_SHOT_EXAMPLE}
+    """
+
+    exam_code = generate(client, model_name, exam_prompt)
+
+    filename = title.lower().replace(" ", "_") + ".tex"
+    tex_file = exams_dir / filename
+    with open(tex_file, "w") as f:
+        f.write(exam_code)
+
+    # Compile PDF
+    # _compile_latex(tex_file)
+
+
+# --- Core Logic ---
+
+
+def generate_course_artifacts(
+    client: genai.Client,
+    plan: Dict[str, Any],
+    config: Dict[str, Any],
+    output_dir: str = "course_repo",
+) -> None:
+    """Generates the physical files for the course (LaTeX, Tests, Workflows)."""
+
+    base_path = Path(output_dir)
+    _ensure_directory(base_path)
+
+    print(f"\n--- Generating Course Repository in '{output_dir}' ---")
+
+    # 1. GitHub Workflow and Student README
+    _write_repo_scaffold(base_path)
+
+    # 2. Iterate Weeks for Homework
+    weeks = plan.get("weeks", [])
+    model_name = ARTIFACT_MODEL
+
+    for week in weeks:
+        with span("week_artifacts", cat="week", week=week["week"]):
+            _generate_week_artifacts(client, model_name, week, base_path)
 
-            # Compile PDF
-            # _compile_latex(tex_file)
+    # 3. Generate Exams (2 Midterms, 1 Final)
+    exams_dir = base_path / "exams"
+    _ensure_directory(exams_dir)
+
+    for title, topics_subset in _exam_configs(weeks):
+        with span("exam", cat="exam", title=title):
+            _generate_exam(client, model_name, title, topics_subset, exams_dir)
 
 
 def export_calendar(
@@ -625,90 +860,70 @@ def export_calendar(
 
 def generate_plan(config: Dict[str, Any]) -> Dict[str, Any]:
     """Generates a course plan, calendar, and full course repository."""
-    load_dotenv()
-    api_key = os.getenv("GEMINI_API_KEY") or config.get("gemini_api_key")
-    if not api_key:
-        raise ValueError(
-            "Missing GEMINI_API_KEY in .env or gemini_api_key in configuration."
-        )
-
-    client = genai.Client(api_key=api_key)
+    client = _create_client(config)
 
     plan = {"weeks": []}
     current_date = datetime.fromisoformat(config["quarter"]["start"])
 
     # --- 1. Plan Generation (Schedule) ---
-    subsections = config.get("book", {}).get("subsections", [])
-    sections_map: Dict[str, List[str]] = {}
+    with span("grouping"):
+        sections = _plan_sections(config)
 
-    # Simple grouper
-    for sub in subsections:
-        try:
-            numbering = sub.split(" ")[0]
-            parts = numbering.split(".")
-            section_key = f"{parts[0]}.{parts[1]}" if len(parts) >= 2 else numbering
-        except:
-            section_key = "General"
-        if section_key not in sections_map:
-            sections_map[section_key] = []
-        sections_map[section_key].append(sub)
+    print(f"Generating plan for {len(sections)} sections...")
 
-    print(f"Generating plan for {len(sections_map)} sections...")
-
-    for i, (section_key, section_subs) in enumerate(sections_map.items()):
-        subs_list_str = "\n".join(f"- {s}" for s in section_subs)
-        prompt = f"""
-        Context: Generating a course plan for SICP. Section: "{section_key}"
-        Subsections: {subs_list_str}
-        Task: Create a 1-week lesson plan covering this section.
-        """
-
-        try:
-            response = client.models.generate_content(
-                model="gemini-2.5-flash-lite",
-                contents=prompt,
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json", response_schema=WeekPlan
-                ),
-            )
-            week_data = json.loads(response.text)
-            week_data.update(
-                {
-                    "section": section_key,
-                    "week": i + 1,
-                    "dates": {
-                        "monday": current_date.date().isoformat(),
-                        "wednesday": (current_date + timedelta(days=2))
-                        .date()
-                        .isoformat(),
-                        "friday": (current_date + timedelta(days=4)).date().isoformat(),
-                    },
-                }
-            )
-            plan["weeks"].append(week_data)
-            print(f"✓ Planned Week {i + 1}")
-        except Exception as e:
-            print(f"✗ Error Planning Week {i + 1}: {e}")
+    with span("planning"):
+        for i, (section_key, section_subs, pages) in enumerate(sections):
+            with span("plan_week", cat="week", week=i + 1, section=section_key):
+                week_data = _plan_week(
+                    client, section_key, section_subs, i + 1, current_date, pages
+                )
+            if week_data is not None:
+                plan["weeks"].append(week_data)
 
-        current_date += timedelta(weeks=1)
+            current_date += timedelta(weeks=1)
 
     # --- 2. Exports ---
-    with open("plan.json", "w") as f:
-        json.dump(plan, f, indent=2)
+    with span("write_plan_json"):
+        with open("plan.json", "w") as f:
+            json.dump(plan, f, indent=2)
 
-    export_calendar(plan, config)
+    with span("export_calendar"):
+        export_calendar(plan, config)
 
     # --- 3. Artifact Generation (Repo, LaTeX, Tests) ---
-    generate_course_artifacts(client, plan, config)
+    with span("generate_course_artifacts"):
+        generate_course_artifacts(client, plan, config)
 
     return plan
 
 
-if __name__ == "__main__":
-    # Example usage
+@click.command()
+@click.argument("config_path", default="config.json")
+@click.option(
+    "--trace",
+    "trace_path",
+    default=None,
+    help="Write stage/week/call spans as Chrome trace-event JSON to this file.",
+)
+@click.option(
+    "--profile",
+    "profile_path",
+    default=None,
+    help="Run under cProfile and dump stats to this file.",
+)
+def main(
+    config_path: str, trace_path: Optional[str], profile_path: Optional[str]
+) -> None:
     try:
-        with open("config.json") as f:
+        with open(config_path) as f:
             config = json.load(f)
-        generate_plan(config)
     except FileNotFoundError:
-        print("config.json not found.")
+        print(f"{config_path} not found.")
+        return
+
+    with traced("generate_plan", trace_path, profile_path):
+        generate_plan(config)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,14 @@
 import json
-from typing import Any, List, Optional, TypedDict
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, TypedDict
 
 import click
 from pypdf import PdfReader
 
+from coursepack.toc_index import write_toc_index
+
 
 class TocItem(TypedDict):
     title: str
@@ -11,9 +16,134 @@ class TocItem(TypedDict):
     children: List["TocItem"]
 
 
+# Numbered contents line, e.g. "1.2.3 Orders of Growth ........ 57"
+TOC_LINE = re.compile(
+    r"^\s*(?P<code>\d+(?:\.\d+)*)\.?\s+(?P<title>.+?)(?:\s*\.{2,}\s*|\s+)(?P<page>\d+)\s*$"
+)
+
+# --- Text-Scan Fallback ---
+
+_reader: Optional[PdfReader] = None
+
+
+def _init_worker(pdf_path: str) -> None:
+    # Open the PDF once per worker process instead of once per page.
+    global _reader
+    _reader = PdfReader(pdf_path)
+
+
+def _extract_page_text(index: int) -> str:
+    assert _reader is not None
+    return _reader.pages[index].extract_text() or ""
+
+
+def parse_toc_lines(text: str) -> List[Tuple[str, str, int]]:
+    """Returns (code, title, page) for each numbered contents line in `text`."""
+    entries: List[Tuple[str, str, int]] = []
+    for line in text.splitlines():
+        match = TOC_LINE.match(line)
+        if match:
+            title = match.group("title").rstrip(" .")
+            entries.append((match.group("code"), title, int(match.group("page"))))
+    return entries
+
+
+def build_toc_tree(entries: List[Tuple[str, str, int]]) -> List[TocItem]:
+    """Nests numbered entries by their codes ("1" > "1.2" > "1.2.3").
+
+    Titles keep their code ("1.2 Data"), so the index and planner can match
+    them. An entry whose parent was not found (a missed line or page break)
+    hangs off a placeholder parent rather than becoming a chapter itself.
+    """
+    roots: List[TocItem] = []
+    by_code: Dict[str, TocItem] = {}
+
+    def place(code: str, title: str, page: int) -> TocItem:
+        item = TocItem(title=f"{code} {title}", page=page, children=[])
+        by_code[code] = item
+        parent_code = code.rpartition(".")[0]
+        if not parent_code:
+            roots.append(item)
+        else:
+            parent = by_code.get(parent_code) or place(parent_code, "Untitled", page)
+            parent["children"].append(item)
+        return item
+
+    for code, title, page in entries:
+        place(code, title, page)
+    return roots
+
+
+def collect_contents(
+    texts: Iterable[str], min_entries: int = 3
+) -> List[Tuple[str, str, int]]:
+    """Collects numbered entries from page texts until the contents end.
+
+    The contents start at the first page with at least `min_entries` matches,
+    which keeps stray numbered lines (ISBNs, copyright notes) from starting
+    them. After that every page counts, however short, and collection stops
+    at the first page with no entries or the first code that does not
+    advance the numbering (e.g. "1.1" after "3.2"). `texts` is consumed
+    lazily, so nothing after that page is read.
+    """
+    entries: List[Tuple[str, str, int]] = []
+    last: Optional[Tuple[int, ...]] = None
+    for text in texts:
+        page_entries = parse_toc_lines(text)
+        if not entries and len(page_entries) < min_entries:
+            continue
+        if not page_entries:
+            return entries
+        for entry in page_entries:
+            code = tuple(int(part) for part in entry[0].split("."))
+            if last is not None and code <= last:
+                return entries
+            entries.append(entry)
+            last = code
+    return entries
+
+
+def scan_contents_pages(
+    pdf_path: str,
+    workers: Optional[int] = None,
+    max_pages: int = 60,
+    min_entries: int = 3,
+) -> List[Tuple[str, str, int]]:
+    """Extracts numbered entries from the contents pages of `pdf_path`.
+
+    Pages are extracted in batches across a process pool, starting from the
+    front of the book. Batches are only submitted while `collect_contents`
+    asks for more text, so at most one batch past the contents is extracted.
+    """
+    workers = workers or os.cpu_count() or 1
+    total = min(len(PdfReader(pdf_path).pages), max_pages)
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(pdf_path,)
+    ) as pool:
+
+        def texts() -> Iterator[str]:
+            for start in range(0, total, workers):
+                batch = range(start, min(start + workers, total))
+                yield from pool.map(_extract_page_text, batch)
+
+        return collect_contents(texts(), min_entries)
+
+
 @click.command()
 @click.argument("pdf_path")
-def main(pdf_path: str) -> None:
+@click.option(
+    "--workers", default=None, type=int, help="Processes for the text-scan fallback."
+)
+@click.option("--max-pages", default=60, help="Front pages to search for the contents.")
+@click.option(
+    "--page-offset",
+    default=0,
+    help="Added to printed page numbers found by the text-scan fallback.",
+)
+def main(
+    pdf_path: str, workers: Optional[int], max_pages: int, page_offset: int
+) -> None:
     reader: PdfReader = PdfReader(pdf_path)
     outlines: List[Any] = reader.outline
 
@@ -41,8 +171,18 @@ def main(pdf_path: str) -> None:
         return result
 
     toc: List[TocItem] = parse_outline(outlines)
+    if not toc:
+        # No bookmarks (scanned or older PDFs): parse the printed contents.
+        print("No PDF outline found; scanning contents pages...")
+        entries = scan_contents_pages(pdf_path, workers, max_pages)
+        toc = build_toc_tree(
+            [(code, title, page + page_offset) for code, title, page in entries]
+        )
+        print(f"Found {len(entries)} numbered entries.")
+
     with open("toc.json", "w") as f:
         json.dump(toc, f, indent=2)
+    write_toc_index(toc, "toc.idx")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,291 @@
+import json
+import mmap
+import re
+import struct
+import zlib
+from typing import TYPE_CHECKING, Iterator, List, Optional, Set, Tuple
+
+import click
+import typing_extensions as typing
+
+if TYPE_CHECKING:
+    # toc_extractor writes the index, so only import its types for checking.
+    from coursepack.toc_extractor import TocItem
+
+# --- File Format ---
+#
+# header   MAGIC, entry count, hash slots, strings offset
+# entries  fixed-size records in pre-order, so every sub-tree is contiguous
+# slots    open-addressing table (crc32 of code, linear probing) -> entry;
+#          entries with an empty code are not in the table
+# strings  UTF-8 codes and titles referenced by offset/length
+
+MAGIC = b"CPTOCIX1"
+HEADER = struct.Struct("<8sIII")
+# parent, subtree_end, page_start, page_end, code_off, title_off,
+# code_len, title_len, depth
+ENTRY = struct.Struct("<iIIIIIHHHxx")
+# (code_off, code_len) read straight out of an ENTRY during hash probes
+CODE_REF = struct.Struct("<I4xH")
+CODE_REF_OFFSET = 16
+SLOT = struct.Struct("<i")
+EMPTY = -1
+
+# Leading numbering code in a title or label, e.g. "1.2.3 Orders of Growth"
+CODE_PREFIX = re.compile(r"^\s*(\d+(?:\.\d+)*)\.?\s+(.*)$")
+
+
+class TocEntry(typing.TypedDict):
+    """A decoded index record."""
+
+    index: int
+    code: str
+    title: str
+    depth: int
+    page_start: int
+    page_end: int
+    parent: int
+    subtree_end: int
+
+
+def split_code(label: str) -> Tuple[Optional[str], str]:
+    """Splits "1.2.3 Title" into ("1.2.3", "Title"); (None, label) if unnumbered."""
+    match = CODE_PREFIX.match(label)
+    if match is None:
+        return None, label
+    return match.group(1), match.group(2)
+
+
+# --- Writer ---
+
+
+def _flatten(toc: List["TocItem"]) -> List[Tuple[str, str, int, int, int]]:
+    """Pre-order (code, title, depth, page, parent) rows.
+
+    Codes come from a numbered title when present. When none of an item's
+    siblings are numbered either, the code comes from its position ("2.3" is
+    the third child of the second chapter), which matches how SICP-style
+    outlines are numbered; only chapters with children count, so a childless
+    "Foreword" does not shift every chapter's code. Anything else (a "Preface" next to numbered
+    chapters) gets an empty code and is left out of the hash table, so it
+    can never shadow a real section. Numbered codes that repeat (multi-part
+    or multi-book outlines) are ambiguous, so they get an empty code as well.
+    """
+    explicit: Set[str] = set()
+    duplicates: Set[str] = set()
+
+    def collect(items: List["TocItem"]) -> None:
+        for item in items:
+            code, _ = split_code(item["title"])
+            if code is not None:
+                if code in explicit:
+                    duplicates.add(code)
+                explicit.add(code)
+            collect(item["children"])
+
+    collect(toc)
+    if duplicates:
+        print(
+            f"⚠ {len(duplicates)} TOC codes appear more than once and are not "
+            f"indexed: {', '.join(sorted(duplicates)[:5])}"
+        )
+    rows: List[Tuple[str, str, int, int, int]] = []
+
+    def walk(
+        items: List["TocItem"], prefix: Optional[str], depth: int, parent: int
+    ) -> None:
+        labels = [split_code(item["title"]) for item in items]
+        positional = prefix is not None and all(code is None for code, _ in labels)
+        position = 0
+        for item, (code, title) in zip(items, labels):
+            if code in duplicates:
+                code = ""
+            elif code is None:
+                # Top-level entries without children are front or back matter.
+                if positional and (depth > 0 or item["children"]):
+                    position += 1
+                    code = f"{prefix}{position}"
+                else:
+                    code = ""
+                if code in explicit:
+                    code = ""
+            index = len(rows)
+            rows.append((code, title, depth, item["page"], parent))
+            walk(item["children"], f"{code}." if code else None, depth + 1, index)
+
+    walk(toc, "", 0, EMPTY)
+    return rows
+
+
+def write_toc_index(toc: List["TocItem"], path: str) -> None:
+    """Writes the compact, memory-mappable index for `toc` to `path`."""
+    rows = _flatten(toc)
+    count = len(rows)
+
+    # Sub-tree extents: an entry's sub-tree ends at the next entry that is
+    # not deeper than it.
+    subtree_end = [count] * count
+    stack: List[int] = []
+    for i, (_, _, depth, _, _) in enumerate(rows):
+        while stack and rows[stack[-1]][2] >= depth:
+            subtree_end[stack.pop()] = i
+        stack.append(i)
+
+    last_page = max((row[3] for row in rows), default=0)
+
+    strings = bytearray()
+    records = bytearray()
+    for i, (code, title, depth, page, parent) in enumerate(rows):
+        end = subtree_end[i]
+        next_page = rows[end][3] if end < count else last_page + 1
+        code_bytes, title_bytes = code.encode(), title.encode()
+        code_off = len(strings)
+        strings += code_bytes
+        title_off = len(strings)
+        strings += title_bytes
+        records += ENTRY.pack(
+            parent,
+            end,
+            page,
+            max(page, next_page - 1),
+            code_off,
+            title_off,
+            len(code_bytes),
+            len(title_bytes),
+            depth,
+        )
+
+    # Keep the load factor at or below 1/2 so probes stay short.
+    slots = 1
+    while slots < count * 2:
+        slots *= 2
+    table = [EMPTY] * slots
+    for i, row in enumerate(rows):
+        if not row[0]:
+            continue
+        h = zlib.crc32(row[0].encode()) & (slots - 1)
+        while table[h] != EMPTY:
+            h = (h + 1) & (slots - 1)
+        table[h] = i
+
+    strings_off = HEADER.size + len(records) + slots * SLOT.size
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, count, slots, strings_off))
+        f.write(records)
+        f.write(b"".join(SLOT.pack(i) for i in table))
+        f.write(strings)
+
+
+# --- Reader ---
+
+
+class TocIndex:
+    """Read-only, memory-mapped view of a TOC index file.
+
+    Nothing is parsed up front: `lookup()` is a hash probe and `subtree()`
+    walks a contiguous run of records.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self._slots, self._strings_off = HEADER.unpack_from(
+            self._buf
+        )
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a coursepack TOC index.")
+        self._slots_off = HEADER.size + self.count * ENTRY.size
+
+    def close(self) -> None:
+        self._buf.close()
+
+    def __enter__(self) -> "TocIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._strings_off + offset
+        return self._buf[start : start + length].decode()
+
+    def entry(self, index: int) -> TocEntry:
+        (
+            parent,
+            subtree_end,
+            page_start,
+            page_end,
+            code_off,
+            title_off,
+            code_len,
+            title_len,
+            depth,
+        ) = ENTRY.unpack_from(self._buf, HEADER.size + index * ENTRY.size)
+        return TocEntry(
+            index=index,
+            code=self._string(code_off, code_len),
+            title=self._string(title_off, title_len),
+            depth=depth,
+            page_start=page_start,
+            page_end=page_end,
+            parent=parent,
+            subtree_end=subtree_end,
+        )
+
+    def _find(self, code: str) -> int:
+        key = code.encode()
+        mask = self._slots - 1
+        h = zlib.crc32(key) & mask
+        while True:
+            (index,) = SLOT.unpack_from(self._buf, self._slots_off + h * SLOT.size)
+            if index == EMPTY:
+                return EMPTY
+            code_off, code_len = CODE_REF.unpack_from(
+                self._buf, HEADER.size + index * ENTRY.size + CODE_REF_OFFSET
+            )
+            start = self._strings_off + code_off
+            if self._buf[start : start + code_len] == key:
+                return index
+            h = (h + 1) & mask
+
+    def lookup(self, code: str) -> Optional[TocEntry]:
+        """The entry numbered `code` (e.g. "1.2.3"), or None."""
+        if not code:
+            return None
+        index = self._find(code)
+        return None if index == EMPTY else self.entry(index)
+
+    def ancestor(self, code: str, depth: int) -> Optional[TocEntry]:
+        """The entry's ancestor at `depth` (0 = chapter), or itself if shallower."""
+        entry = self.lookup(code)
+        while entry is not None and entry["depth"] > depth:
+            entry = self.entry(entry["parent"])
+        return entry
+
+    def subtree(self, code: str) -> Iterator[TocEntry]:
+        """The entry numbered `code` followed by all of its descendants."""
+        index = self._find(code) if code else EMPTY
+        if index == EMPTY:
+            return
+        first = self.entry(index)
+        yield first
+        for i in range(index + 1, first["subtree_end"]):
+            yield self.entry(i)
+
+
+@click.command()
+@click.argument("toc_path", default="toc.json")
+@click.argument("index_path", default="toc.idx")
+def main(toc_path: str, index_path: str) -> None:
+    """Builds INDEX_PATH from an existing TOC_PATH."""
+    with open(toc_path) as f:
+        toc: List["TocItem"] = json.load(f)
+    write_toc_index(toc, index_path)
+    print(f"Indexed {len(_flatten(toc))} entries to {index_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import cProfile
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import typing_extensions as typing
+
+# --- Schema Definitions ---
+
+
+class TraceEvent(typing.TypedDict):
+    """A Chrome trace-event "complete" (ph=X) event."""
+
+    name: str
+    cat: str
+    ph: str
+    ts: float
+    dur: float
+    pid: int
+    tid: int
+    args: Dict[str, Any]
+
+
+# --- Tracer ---
+
+
+class Tracer:
+    """Collects nested, per-thread timing spans.
+
+    Spans are recorded as Chrome "complete" events, so nesting is derived by
+    the viewer from start/duration on each thread. Start times are wall-clock
+    epoch microseconds, so traces from several workers line up on one
+    timeline. Load the exported file in chrome://tracing or
+    https://ui.perfetto.dev.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self._events: List[TraceEvent] = []
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        self._events = []
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    @contextmanager
+    def span(self, name: str, cat: str = "stage", **args: Any) -> Iterator[None]:
+        """Records the wrapped block as a span. No-op while disabled."""
+        if not self.enabled:
+            yield
+            return
+
+        start_us = time.time_ns() / 1000
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            event = TraceEvent(
+                name=name,
+                cat=cat,
+                ph="X",
+                ts=start_us,
+                dur=(end - start) * 1e6,
+                pid=os.getpid(),
+                tid=threading.get_ident(),
+                args=args,
+            )
+            with self._lock:
+                self._events.append(event)
+
+    def events(self) -> List[TraceEvent]:
+        with self._lock:
+            return sorted(self._events, key=lambda e: e["ts"])
+
+    def export_chrome_trace(self, filename: str) -> None:
+        """Writes collected spans as Chrome trace-event JSON."""
+        with open(filename, "w") as f:
+            json.dump(
+                {"traceEvents": self.events(), "displayTimeUnit": "ms"}, f, indent=2
+            )
+        print(f"Trace exported to {filename}")
+
+
+TRACER = Tracer()
+
+
+def span(name: str, cat: str = "stage", **args: Any):
+    """Shortcut for `TRACER.span(...)`."""
+    return TRACER.span(name, cat, **args)
+
+
+@contextmanager
+def profile(filename: Optional[str]) -> Iterator[None]:
+    """Runs the wrapped block under cProfile and dumps stats to `filename`.
+
+    Inspect the dump with `python -m pstats <file>` or snakeviz. Passing
+    `None` disables profiling.
+    """
+    if not filename:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(filename)
+        print(f"Profile written to {filename}")
+
+
+def per_process_path(filename: str) -> str:
+    """Tags `filename` with host and pid ("trace.json" -> "trace.host-42.json").
+
+    Lets several worker processes share one output directory.
+    """
+    path = Path(filename)
+    return str(
+        path.with_name(f"{path.stem}.{socket.gethostname()}-{os.getpid()}{path.suffix}")
+    )
+
+
+@contextmanager
+def traced(
+    name: str, trace_path: Optional[str], profile_path: Optional[str]
+) -> Iterator[None]:
+    """Runs the wrapped block as a top-level span, tracing and/or profiling it.
+
+    The trace is exported to `trace_path` when the block exits, even on error.
+    """
+    if trace_path:
+        TRACER.enable()
+    try:
+        with profile(profile_path), span(name):
+            yield
+    finally:
+        if trace_path:
+            TRACER.export_chrome_trace(trace_path)
+            TRACER.disable()
@@ -0,0 +1,103 @@
+import tarfile
+import zipfile
+from pathlib import Path
+
+import pytest
+
+from coursepack.fanout import check_student_id, fan_out
+
+
+@pytest.fixture
+def course(tmp_path):
+    course = tmp_path / "course"
+    (course / "homework" / "week_01").mkdir(parents=True)
+    (course / "README.md").write_text("# Course\n")
+    (course / "homework" / "week_01" / "assignment.tex").write_text("hw")
+    return course
+
+
+@pytest.mark.parametrize("student", ["", ".", "..", "../course", "a/b", "a\\b", "/abs"])
+def test_rejects_unsafe_student_ids(student):
+    with pytest.raises(ValueError):
+        check_student_id(student)
+
+
+def test_unsafe_id_never_touches_the_course(course, tmp_path):
+    with pytest.raises(ValueError):
+        fan_out(str(course), ["../course"], str(tmp_path / "out"))
+
+    assert (course / "README.md").exists()
+
+
+def test_symlinked_student_dir_is_not_deleted(course, tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    (out / "alice").symlink_to(course)
+
+    with pytest.raises(ValueError):
+        fan_out(str(course), ["alice"], str(out))
+
+    assert (course / "README.md").exists()
+
+
+def test_auto_link_never_shares_inodes(course, tmp_path):
+    out = tmp_path / "out"
+    fan_out(str(course), ["alice", "bob"], str(out))
+
+    rel = Path("homework") / "week_01" / "assignment.tex"
+    assert (course / rel).stat().st_nlink == 1
+    (out / "alice" / rel).write_text("edited")
+    assert (out / "bob" / rel).read_text() == "hw"
+    assert (course / rel).read_text() == "hw"
+
+
+def test_readme_block_keeps_literal_braces(course, tmp_path):
+    block = "Hi {student}, seed {seed}\n(lambda (x) {x}) \\textbf{bold} {}\n"
+
+    fan_out(str(course), ["alice"], str(tmp_path / "out"), readme_block=block)
+
+    readme = (tmp_path / "out" / "alice" / "README.md").read_text()
+    assert readme.startswith("# Course\n")
+    assert "Hi alice, seed " in readme and "{seed}" not in readme
+    assert "(lambda (x) {x}) \\textbf{bold} {}" in readme
+
+
+@pytest.mark.parametrize("fmt", ["tar", "zip"])
+def test_archives_are_base_plus_student_tail(course, tmp_path, fmt):
+    overrides = tmp_path / "overrides"
+    (overrides / "alice" / "homework" / "week_01").mkdir(parents=True)
+    (overrides / "alice" / "homework" / "week_01" / "assignment.tex").write_text("v")
+    out = tmp_path / "out"
+
+    fan_out(
+        str(course),
+        ["alice", "bob"],
+        str(out),
+        overrides_dir=str(overrides),
+        readme_block="{student}",
+        archive=fmt,
+    )
+
+    def read(student):
+        if fmt == "tar":
+            with tarfile.open(out / f"{student}.tar.gz") as tar:
+                return {m.name: tar.extractfile(m).read() for m in tar.getmembers()}
+        with zipfile.ZipFile(out / f"{student}.zip") as zf:
+            return {name: zf.read(name) for name in zf.namelist()}
+
+    alice, bob = read("alice"), read("bob")
+    assert (
+        sorted(alice)
+        == sorted(bob)
+        == [
+            "README.md",
+            "homework/week_01/assignment.tex",
+        ]
+    )
+    assert alice["homework/week_01/assignment.tex"] == b"v"
+    assert bob["homework/week_01/assignment.tex"] == b"hw"
+    assert alice["README.md"].endswith(b"alice")
+    assert bob["README.md"].endswith(b"bob")
+    assert sorted(p.name for p in out.iterdir()) == sorted(
+        f"{s}.{'tar.gz' if fmt == 'tar' else 'zip'}" for s in ("alice", "bob")
+    )
@@ -0,0 +1,206 @@
+import json
+import threading
+import time
+
+import pytest
+
+from coursepack import jobqueue
+from coursepack.jobqueue import (
+    DONE,
+    FAILED,
+    JobQueue,
+    JobSpec,
+    coordinate,
+    enqueue_course,
+    run_worker,
+)
+
+
+def _job(key: str, kind: str = "exam") -> JobSpec:
+    return JobSpec(kind=kind, key=key, payload={"key": key})
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "q"), lease_seconds=60, max_attempts=2)
+
+
+def test_claim_is_exclusive_and_in_order(queue):
+    queue.enqueue([_job("a"), _job("b")])
+
+    first = queue.claim("w1")
+    second = queue.claim("w2")
+
+    assert first["key"] == "a" and first["attempts"] == 1
+    assert second["key"] == "b"
+    assert queue.claim("w3") is None
+
+
+def test_enqueue_ignores_existing_keys(queue):
+    queue.enqueue([_job("a")])
+    queue.enqueue([_job("a"), _job("b")])
+
+    assert queue.counts() == {"pending": 2}
+
+
+def test_complete_stores_result_and_enqueues_follow_ups(queue):
+    queue.enqueue([_job("plan", kind="plan_week")])
+    job = queue.claim("w1")
+
+    assert queue.complete(job["id"], "w1", {"week": 1}, [_job("art", "art")])
+
+    assert queue.results("plan_week") == [{"week": 1}]
+    assert queue.claim("w1")["key"] == "art"
+
+
+def test_only_the_lease_holder_can_complete(queue):
+    queue.enqueue([_job("a")])
+    job = queue.claim("w1")
+
+    assert not queue.heartbeat(job["id"], "w2")
+    assert not queue.complete(job["id"], "w2", "stolen")
+    assert queue.heartbeat(job["id"], "w1")
+    assert queue.complete(job["id"], "w1", "ok")
+    assert queue.counts() == {DONE: 1}
+
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    queue = JobQueue(str(tmp_path / "q"), lease_seconds=0.05, max_attempts=3)
+    queue.enqueue([_job("a")])
+    ghost = queue.claim("ghost")
+    time.sleep(0.1)
+
+    job = queue.claim("w1")
+
+    assert job["id"] == ghost["id"] and job["attempts"] == 2
+    # The original owner lost its lease and can no longer finish the job.
+    assert not queue.complete(ghost["id"], "ghost", "late")
+    assert queue.complete(job["id"], "w1", "ok")
+
+
+def test_expired_lease_fails_after_max_attempts(tmp_path):
+    queue = JobQueue(str(tmp_path / "q"), lease_seconds=0.05, max_attempts=1)
+    queue.enqueue([_job("a")])
+    queue.claim("ghost")
+    time.sleep(0.1)
+
+    assert queue.claim("w1") is None
+    assert queue.failures() == [{"key": "a", "error": "lease expired"}]
+    assert queue.is_settled()
+
+
+def test_fail_retries_then_gives_up(queue):
+    queue.enqueue([_job("a")])
+
+    job = queue.claim("w1")
+    queue.fail(job["id"], "w1", "429 quota")
+    assert queue.counts() == {"pending": 1}
+
+    job = queue.claim("w1")
+    queue.fail(job["id"], "w1", "429 quota again")
+
+    assert queue.counts() == {FAILED: 1}
+    assert queue.failures() == [{"key": "a", "error": "429 quota again"}]
+    assert queue.claim("w1") is None
+
+
+def test_enqueue_course_refuses_a_second_run(queue, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # no toc.idx here
+    config = {
+        "book": {"subsections": ["1.1.1 A", "1.2.1 B"]},
+        "quarter": {"start": "2026-01-05"},
+    }
+    enqueue_course(queue, config, str(tmp_path / "out"))
+
+    other = {"book": {"subsections": ["3.1.1 C"]}, "quarter": config["quarter"]}
+    with pytest.raises(ValueError):
+        enqueue_course(queue, other, str(tmp_path / "out"))
+
+    queue.close()
+    enqueue_course(queue, other, str(tmp_path / "out"), reset=True)
+
+    job = queue.claim("w1")
+    assert job["payload"]["section"] == "3.1"
+    assert queue.claim("w1") is None
+    assert not queue.is_closed()
+    with open(queue.queue_dir / "run.json") as f:
+        assert json.load(f)["config"] == other
+
+
+def test_api_errors_fail_artifact_jobs_for_retry(queue, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    stop = threading.Event()
+
+    class Models:
+        def generate_content(self, **kwargs):
+            stop.set()
+            raise RuntimeError("429 RESOURCE_EXHAUSTED")
+
+    class Client:
+        models = Models()
+
+    monkeypatch.setattr(jobqueue, "_create_client", lambda config: Client())
+    config = {"book": {"subsections": []}, "quarter": {"start": "2026-01-05"}}
+    enqueue_course(queue, config, str(tmp_path / "out"))
+    week = {
+        "week": 1,
+        "key_concepts": [],
+        "homework": {"exercises": [], "description": ""},
+    }
+    queue.enqueue(
+        [
+            JobSpec(
+                kind="week_artifacts", key="week_artifacts:01", payload={"week": week}
+            )
+        ]
+    )
+    queue.close()
+
+    run_worker(queue, "w1", poll_interval=0, stop=stop)
+    assert queue.counts() == {"pending": 1}
+
+    run_worker(queue, "w1", poll_interval=0)
+    assert queue.counts() == {FAILED: 1}
+    assert "429" in queue.failures()[0]["error"]
+    assert not (tmp_path / "out" / "homework").exists()
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_coordinate_stops_when_every_local_worker_dies(queue, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    def no_key(config):
+        raise ValueError("Missing GEMINI_API_KEY")
+
+    monkeypatch.setattr(jobqueue, "_create_client", no_key)
+    config = {"book": {"subsections": ["1.1.1 A"]}, "quarter": {"start": "2026-01-05"}}
+    enqueue_course(queue, config, str(tmp_path / "out"))
+
+    with pytest.raises(RuntimeError, match="local workers died"):
+        coordinate(queue, local_workers=2, poll_interval=0.01)
+
+
+def test_worker_that_lost_its_lease_does_not_publish(queue, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    out = tmp_path / "out"
+    stop = threading.Event()
+
+    def stale_handler(client, payload, staging):
+        # Another worker re-claims the job while this attempt is running.
+        with queue._transaction() as conn:
+            conn.execute("UPDATE jobs SET lease_owner = 'w2'")
+        (staging / "homework").mkdir(parents=True)
+        (staging / "homework" / "stale.tex").write_text("stale")
+        stop.set()
+
+    monkeypatch.setattr(jobqueue, "_create_client", lambda config: None)
+    monkeypatch.setitem(jobqueue.HANDLERS, "exam", stale_handler)
+    config = {"book": {"subsections": []}, "quarter": {"start": "2026-01-05"}}
+    enqueue_course(queue, config, str(out))
+    queue.enqueue([_job("exam:Final")])
+
+    run_worker(queue, "w1", poll_interval=0, stop=stop)
+
+    assert not (out / "homework" / "stale.tex").exists()
+    assert not list((out / ".staging").iterdir())
+    assert queue.counts() == {"running": 1}
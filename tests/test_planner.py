@@ -0,0 +1,65 @@
+from coursepack.planner import _group_subsections, _plan_sections
+from coursepack.toc_index import TocIndex, write_toc_index
+
+
+def _item(title, page, *children):
+    return {"title": title, "page": page, "children": list(children)}
+
+
+SUBSECTIONS = ["1.1.1 Expressions", "1.1.2 Naming", "1.2.1 Recursion"]
+
+
+def _config(tmp_path, toc):
+    path = tmp_path / "toc.idx"
+    write_toc_index(toc, str(path))
+    return {"book": {"subsections": SUBSECTIONS, "toc_index": str(path)}}
+
+
+def test_group_subsections_without_index():
+    assert _group_subsections(SUBSECTIONS + ["Appendix"]) == {
+        "1.1": ["1.1.1 Expressions", "1.1.2 Naming"],
+        "1.2": ["1.2.1 Recursion"],
+        "General": ["Appendix"],
+    }
+
+
+def test_plan_sections_uses_index_page_ranges(tmp_path):
+    toc = [
+        _item(
+            "Procedures",
+            5,
+            _item("Elements", 6, _item("Expressions", 6), _item("Naming", 8)),
+            _item("Processes", 30, _item("Recursion", 31)),
+        ),
+        _item("Data", 80, _item("Abstraction", 81)),
+    ]
+
+    assert _plan_sections(_config(tmp_path, toc)) == [
+        ("1.1", ["1.1.1 Expressions", "1.1.2 Naming"], [6, 29]),
+        ("1.2", ["1.2.1 Recursion"], [30, 79]),
+    ]
+
+
+def test_mismatched_index_titles_are_not_trusted(tmp_path, capsys):
+    # An extra numbered-by-position chapter shifts every code by one.
+    toc = [
+        _item("Prologue", 1, _item("Overview", 2, _item("History", 2))),
+        _item(
+            "Procedures",
+            5,
+            _item("Elements", 6, _item("Expressions", 6), _item("Naming", 8)),
+            _item("Processes", 30, _item("Recursion", 31)),
+        ),
+    ]
+    config = _config(tmp_path, toc)
+
+    with TocIndex(config["book"]["toc_index"]) as index:
+        assert index.lookup("1.1.1")["title"] == "History"
+        groups = _group_subsections(SUBSECTIONS, index)
+
+    assert groups == {
+        "1.1": ["1.1.1 Expressions", "1.1.2 Naming"],
+        "1.2": ["1.2.1 Recursion"],
+    }
+    assert "not 'Expressions'" in capsys.readouterr().out
+    assert [pages for _, _, pages in _plan_sections(config)] == [None, None]
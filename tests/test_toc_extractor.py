@@ -0,0 +1,52 @@
+from coursepack.toc_extractor import build_toc_tree, collect_contents
+
+COPYRIGHT = "ISBN 0 262 01153 0"
+CONTENTS_1 = "Contents\n1 A 1\n1.1 B 2\n1.2 C ..... 5\n2 D 10\n2.1 E 12"
+CONTENTS_2 = "2.2 F 20\n3 G 30"
+BODY = "1 A\nSome prose about 1.1 and 3 things"
+
+
+def _codes(entries):
+    return [code for code, _, _ in entries]
+
+
+def test_short_last_contents_page_is_kept():
+    entries = collect_contents([COPYRIGHT, CONTENTS_1, CONTENTS_2, BODY])
+
+    assert _codes(entries) == ["1", "1.1", "1.2", "2", "2.1", "2.2", "3"]
+    assert entries[-1] == ("3", "G", 30)
+
+
+def test_stops_when_numbering_restarts():
+    restart = "1 A 1\n1.1 B 2"
+    assert _codes(collect_contents([CONTENTS_1, CONTENTS_2, restart])) == [
+        "1",
+        "1.1",
+        "1.2",
+        "2",
+        "2.1",
+        "2.2",
+        "3",
+    ]
+
+
+def test_stops_reading_after_the_contents():
+    read = []
+
+    def pages():
+        for text in [CONTENTS_1, BODY, CONTENTS_2]:
+            read.append(text)
+            yield text
+
+    assert _codes(collect_contents(pages())) == ["1", "1.1", "1.2", "2", "2.1"]
+    assert read == [CONTENTS_1, BODY]
+
+
+def test_build_toc_tree_keeps_codes_and_nests_orphans():
+    # "2" was lost (e.g. on a page break), so "2.1" must not become a chapter.
+    toc = build_toc_tree([("1", "A", 1), ("1.1", "B", 2), ("2.1", "Data", 12)])
+
+    assert [item["title"] for item in toc] == ["1 A", "2 Untitled"]
+    assert toc[0]["children"][0]["title"] == "1.1 B"
+    assert toc[1]["page"] == 12
+    assert toc[1]["children"] == [{"title": "2.1 Data", "page": 12, "children": []}]
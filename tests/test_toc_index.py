@@ -0,0 +1,108 @@
+import zlib
+
+import pytest
+
+from coursepack.toc_index import TocIndex, write_toc_index
+
+
+def _item(title, page, *children):
+    return {"title": title, "page": page, "children": list(children)}
+
+
+TOC = [
+    _item("Preface", 1),
+    _item(
+        "1 Procedures",
+        5,
+        _item("1.1 Elements", 6, _item("1.1.1 Expressions", 6)),
+        _item("1.2 Processes", 30),
+    ),
+    _item("2 Data", 80, _item("2.1 Abstraction", 81)),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = tmp_path / "toc.idx"
+    write_toc_index(TOC, str(path))
+    with TocIndex(str(path)) as index:
+        yield index
+
+
+def test_round_trip(index):
+    assert len(index) == 7
+    entry = index.lookup("1.1.1")
+    assert entry["title"] == "Expressions"
+    assert entry["depth"] == 2
+    assert index.entry(entry["parent"])["code"] == "1.1"
+    assert index.lookup("9") is None
+
+
+def test_page_ranges_run_to_the_next_sibling(index):
+    assert (index.lookup("1")["page_start"], index.lookup("1")["page_end"]) == (5, 79)
+    assert index.lookup("1.1")["page_end"] == 29
+    assert index.lookup("2.1")["page_end"] == 81
+
+
+def test_subtree_and_ancestor(index):
+    assert [e["code"] for e in index.subtree("1")] == ["1", "1.1", "1.1.1", "1.2"]
+    assert [e["code"] for e in index.subtree("1.2")] == ["1.2"]
+    assert list(index.subtree("3")) == []
+    assert index.ancestor("1.1.1", 0)["code"] == "1"
+    assert index.ancestor("1", 1)["code"] == "1"
+
+
+def test_front_matter_does_not_shadow_chapters(index):
+    assert index.lookup("1")["title"] == "Procedures"
+    assert index.lookup("") is None
+    assert index.entry(0)["title"] == "Preface"
+
+
+def test_lookup_probes_past_hash_collisions(tmp_path):
+    # Three entries get an 8-slot table; pick chapter codes sharing a bucket.
+    def bucket(n):
+        return zlib.crc32(str(n).encode()) & 7
+
+    codes = [1] + [n for n in range(2, 200) if bucket(n) == bucket(1)][:2]
+    path = tmp_path / "toc.idx"
+    write_toc_index([_item(f"{n} Chapter {n}", n) for n in codes], str(path))
+
+    with TocIndex(str(path)) as index:
+        for n in codes:
+            assert index.lookup(str(n))["title"] == f"Chapter {n}"
+        missing = next(n for n in range(200, 400) if bucket(n) == bucket(1))
+        assert index.lookup(str(missing)) is None
+
+
+def test_positional_codes_for_unnumbered_outlines(tmp_path):
+    toc = [
+        _item("Foreword", 1),
+        _item("Building", 3, _item("Elements", 4)),
+        _item("Data", 9, _item("Abstraction", 10)),
+        _item("Index", 20),
+    ]
+    path = tmp_path / "toc.idx"
+    write_toc_index(toc, str(path))
+
+    with TocIndex(str(path)) as index:
+        # Childless front and back matter does not shift chapter numbers.
+        assert index.lookup("1")["title"] == "Building"
+        assert index.lookup("1.1")["title"] == "Elements"
+        assert index.lookup("2.1")["title"] == "Abstraction"
+        assert index.lookup("3") is None
+
+
+def test_duplicate_codes_are_left_out_of_the_table(tmp_path, capsys):
+    toc = [
+        _item("Part I", 1, _item("1 Intro", 2, _item("1.1 Start", 3))),
+        _item("Part II", 10, _item("1 Intro", 11), _item("2 Next", 12)),
+    ]
+    path = tmp_path / "toc.idx"
+    write_toc_index(toc, str(path))
+
+    assert "not indexed: 1" in capsys.readouterr().out
+    with TocIndex(str(path)) as index:
+        assert len(index) == 6
+        assert index.lookup("1") is None
+        assert index.lookup("1.1")["title"] == "Start"
+        assert index.lookup("2")["title"] == "Next"
@@ -0,0 +1,68 @@
+import json
+import threading
+
+import pytest
+
+from coursepack.tracing import TRACER, Tracer, span, traced
+
+
+def test_spans_are_a_no_op_while_disabled():
+    tracer = Tracer()
+
+    with tracer.span("work"):
+        pass
+
+    assert tracer.events() == []
+
+
+def test_nested_spans_on_threads_get_their_own_tid():
+    tracer = Tracer()
+    tracer.enable()
+
+    def work(name):
+        with tracer.span(name):
+            with tracer.span(f"{name}.inner"):
+                pass
+
+    threads = [threading.Thread(target=work, args=(f"t{i}",)) for i in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    events = {e["name"]: e for e in tracer.events()}
+    assert events["t0"]["tid"] == events["t0.inner"]["tid"]
+    assert events["t0"]["tid"] != events["t1"]["tid"]
+    outer, inner = events["t1"], events["t1.inner"]
+    assert outer["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"] + 1
+
+
+def test_timestamps_are_wall_clock():
+    first, second = Tracer(), Tracer()
+    first.enable()
+    second.enable()
+
+    with first.span("a"):
+        pass
+    with second.span("b"):
+        pass
+
+    # Separate tracers (e.g. separate workers) share one timeline.
+    assert first.events()[0]["ts"] <= second.events()[0]["ts"]
+    assert first.events()[0]["ts"] > 1.7e15
+
+
+def test_traced_exports_even_when_the_block_raises(tmp_path):
+    path = tmp_path / "trace.json"
+
+    with pytest.raises(RuntimeError):
+        with traced("run", str(path), None):
+            with span("stage"):
+                raise RuntimeError("boom")
+
+    with open(path) as f:
+        trace = json.load(f)
+    assert [e["name"] for e in trace["traceEvents"]] == ["run", "stage"]
+    assert all(e["ph"] == "X" for e in trace["traceEvents"])
+    assert not TRACER.enabled